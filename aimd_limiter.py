@@ -0,0 +1,63 @@
+import collections
+import threading
+
+
+class AIMDLimiter:
+    def __init__(self, min_limit: float, max_limit: float, target_latency: float,
+                 initial_limit: float = None, window: int = 20, adjust_every: int = 5):
+        """
+        Admission controller that adapts how many requests may be in flight at once
+
+        Concurrency grows additively while responses stay fast and is halved
+        when the API errors, rate limits us or latency spikes, like TCP
+        congestion control.
+
+        Args:
+            min_limit: Lowest concurrency the limiter backs off to
+            max_limit: Highest concurrency the limiter grows to
+            target_latency: Mean response time in seconds considered healthy
+            initial_limit: Starting concurrency, defaults to min_limit
+            window: Number of recent response times averaged
+            adjust_every: Number of responses between increases
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.limit = initial_limit if initial_limit is not None else min_limit
+        self.in_flight = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._adjust_every = adjust_every
+        self._since_adjust = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Block until another request may be sent"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < max(1, int(self.limit)))
+            self.in_flight += 1
+
+    def release(self, latency: float, ok: bool):
+        """
+        Record a finished request and adjust the concurrency limit
+
+        Args:
+            latency: Seconds the request took
+            ok: False if the request failed, was rate limited or hit a server error
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._latencies.append(latency)
+            mean = sum(self._latencies) / len(self._latencies)
+            if not ok or latency > 2 * self.target_latency:
+                # Multiplicative decrease, starting a fresh measurement window
+                self.limit = max(self.min_limit, self.limit * 0.5)
+                self._latencies.clear()
+                self._since_adjust = 0
+            else:
+                self._since_adjust += 1
+                if self._since_adjust >= self._adjust_every:
+                    self._since_adjust = 0
+                    if mean <= self.target_latency:
+                        # Additive increase
+                        self.limit = min(self.max_limit, self.limit + 0.5)
+            self._condition.notify_all()
@@ -0,0 +1,65 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List
+
+import orjson
+
+
+class AssetCache:
+    def __init__(self, path: str, site_id: str, ttl: float):
+        """
+        Persistent cache of serial number lookups shared across runs
+
+        Args:
+            path: SQLite database file
+            site_id: Lansweeper site ID, part of every cache key
+            ttl: Seconds a cached lookup stays valid
+        """
+        self.site_id = site_id
+        self.ttl = ttl
+        # Lookups run on worker threads, so share one connection behind a lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS assets ("
+                "site_id TEXT NOT NULL, serial_number TEXT NOT NULL, result BLOB NOT NULL, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (site_id, serial_number))"
+            )
+
+    def get_many(self, serial_numbers: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return unexpired cached lookup results for the given serial numbers"""
+        if not serial_numbers:
+            return {}
+        placeholders = ", ".join("?" * len(serial_numbers))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT serial_number, result FROM assets WHERE site_id = ? AND fetched_at >= ? AND serial_number IN ({placeholders})",
+                [self.site_id, time.time() - self.ttl, *serial_numbers]
+            ).fetchall()
+        return {serial_number: orjson.loads(result) for serial_number, result in rows}
+
+    def put_many(self, results: Dict[str, Dict[str, Any]]):
+        """Store lookup results keyed by serial number"""
+        if not results:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO assets (site_id, serial_number, result, fetched_at) VALUES (?, ?, ?, ?)",
+                [(self.site_id, serial_number, orjson.dumps(result), now) for serial_number, result in results.items()]
+            )
+
+    def invalidate(self, serial_number: str):
+        """Drop a serial number, e.g. after its asset was updated"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM assets WHERE site_id = ? AND serial_number = ?",
+                (self.site_id, serial_number)
+            )
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
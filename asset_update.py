@@ -1,11 +1,23 @@
 import requests
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
 import logging
 import os
-from typing import Optional, Dict, Any
+import re
+import collections
+import functools
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from dotenv import load_dotenv
 from logging_config import setup_loggers
+from asset_cache import AssetCache
+from aimd_limiter import AIMDLimiter
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,35 +31,364 @@ logger = logging.getLogger('asset_update')
 # global variable for manual quit
 quit_processing = False
 
+# Number of serial numbers looked up per aliased GraphQL request, when the API does not support IN
+LOOKUP_BATCH_SIZE = 50
+
+# Number of serial numbers per IN-filtered lookup request, when the API supports IN
+IN_FILTER_BATCH_SIZE = 250
+
+# Number of assets per page when fetching the whole site (FETCH_ALL_ASSETS)
+ALL_ASSETS_PAGE_SIZE = 500
+
+# Number of asset updates sent per GraphQL request
+UPDATE_BATCH_SIZE = 50
+
+# Write buffer for the discrepancy report, large enough to hold a whole run
+REPORT_BUFFER_SIZE = 1024 * 1024
+
+# Lansweeper API allows 150 requests per minute; keep one in reserve
+RATE_LIMIT_REQUESTS = 149
+RATE_LIMIT_WINDOW = 60
+
+# Seconds to hold back requests after the API answers 429 Too Many Requests
+RATE_LIMIT_COOLDOWN = 5
+
+# Number of lookup batches fetched concurrently
+LOOKUP_WORKERS = 4
+
+# Mean response time in seconds below which more concurrent requests are allowed
+TARGET_LATENCY = 1.0
+
+# Whether a field holds a date, by Lansweeper and spreadsheet field name
+IS_DATE_FIELD = {
+    'barCode': False,
+    'purchaseDate': True,
+    'warrantyDate': True,
+    'Barcode Number': False,
+    'Invoice Date': True,
+    'Extended Warranty': True,
+}
+
+# (connect, read) timeout in seconds for Lansweeper API requests
+REQUEST_TIMEOUT = (3.05, 30)
+
+# GraphQL documents are built once and reused, so every request sends the same str object
+# (its hash for persisted queries is cached too). Static documents are constants, documents
+# that depend on the batch size are built by the lru_cached helpers below LansweeperAPI.
+_EDIT_ASSET_MUTATION = """
+mutation EditAsset($siteId: ID!, $key: ID!, $customFields: AssetCustomInput!) {
+    site(id: $siteId) {
+        editAsset(
+            key: $key
+            fields: {
+                assetCustom: $customFields
+            }
+        ) {
+            assetCustom {
+                purchaseDate
+                warrantyDate
+                barCode
+            }
+        }
+    }
+}
+"""
+
+# One aliased serial number lookup, formatted with its index
+_ASSET_LOOKUP = """
+        a{i}: assetResources(
+            assetPagination: {{ limit: 2 }}
+            filters: {{
+                conditions: [{{
+                    path: "assetCustom.serialNumber"
+                    operator: EQUAL
+                    value: $s{i}
+                }}]
+            }}
+            fields: [
+                "key"
+                "assetCustom.barCode"
+                "assetCustom.purchaseDate"
+                "assetCustom.warrantyDate"
+            ]
+        ) {{
+            items
+        }}"""
+
+# One aliased asset edit, formatted with its index
+_ASSET_EDIT = """
+        u{i}: editAsset(
+            key: $k{i}
+            fields: {{
+                assetCustom: $c{i}
+            }}
+        ) {{
+            assetCustom {{
+                purchaseDate
+                warrantyDate
+                barCode
+            }}
+        }}"""
+
+# One page of the assets matching a list of serial numbers, formatted with the page size and FIRST/NEXT
+_ASSETS_IN_QUERY = """
+query GetAssetsBySerials($siteId: ID!, $serials: [String!]!, $cursor: String) {{
+    site(id: $siteId) {{
+        assetResources(
+            assetPagination: {{ limit: {page_size}, page: {page}, cursor: $cursor }}
+            filters: {{
+                conditions: [{{
+                    path: "assetCustom.serialNumber"
+                    operator: IN
+                    values: $serials
+                }}]
+            }}
+            fields: [
+                "key"
+                "assetCustom.serialNumber"
+                "assetCustom.barCode"
+                "assetCustom.purchaseDate"
+                "assetCustom.warrantyDate"
+            ]
+        ) {{
+            pagination {{
+                next
+            }}
+            items
+        }}
+    }}
+}}
+"""
+
+# One page of every asset on the site, formatted with the page size and FIRST/NEXT
+_ALL_ASSETS_QUERY = """
+query GetAllAssets($siteId: ID!, $cursor: String) {{
+    site(id: $siteId) {{
+        assetResources(
+            assetPagination: {{ limit: {page_size}, page: {page}, cursor: $cursor }}
+            fields: [
+                "key"
+                "assetCustom.serialNumber"
+                "assetCustom.barCode"
+                "assetCustom.purchaseDate"
+                "assetCustom.warrantyDate"
+            ]
+        ) {{
+            pagination {{
+                next
+            }}
+            items
+        }}
+    }}
+}}
+"""
+
+class PacedRetry(Retry):
+    """
+    urllib3 Retry that runs a callback before every retried request
+
+    Retries happen inside the HTTP adapter, below the client's request
+    pacing; the callback lets each one be paced and counted like any
+    other request.
+    """
+
+    def __init__(self, *args, before_retry: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.before_retry = before_retry
+
+    def new(self, **kwargs) -> 'PacedRetry':
+        retry = super().new(**kwargs)
+        retry.before_retry = self.before_retry
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.before_retry:
+            self.before_retry()
+
+
 class LansweeperAPI:
-    def __init__(self, site_id: str, pat_token: str):
+    def __init__(self, site_id: str, pat_token: str, cache: Optional[AssetCache] = None, lookup_workers: int = LOOKUP_WORKERS):
         """
         Initialize Lansweeper API client
         
         Args:
             site_id: Your Lansweeper site ID
             pat_token: Personal Access Token
+            cache: Optional persistent cache for serial number lookups
+            lookup_workers: Number of lookup batches fetched concurrently
         """
         self.site_id = site_id
         self.pat_token = pat_token
+        self.cache = cache
+        self.lookup_workers = lookup_workers
         self.base_url = f"https://api.lansweeper.com/api/v2/graphql"
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Token {pat_token}"
         }
         self.request_count = 0
+        self._request_lock = threading.Lock()
+        self._request_times = collections.deque()
+        self._paused_until = 0.0  # Set after the API rate limits us
+        self._persisted_queries = None  # Unknown until the first response
+        self._in_filter = None  # Whether the API supports IN filters, unknown until the first lookup
+        # Lookup workers plus the background update worker can have requests in flight at once
+        max_concurrency = lookup_workers + 1
+
+        # Grow or shrink the number of concurrent requests with API latency and errors
+        self.limiter = AIMDLimiter(min_limit=1, max_limit=max_concurrency,
+                                   target_latency=TARGET_LATENCY, initial_limit=2)
+
+        # Reuse keep-alive connections across requests instead of a new TLS handshake per call.
+        # All traffic goes to one host, so a single pool holding one connection per concurrent
+        # request is enough; blocking on the pool avoids throwaway connections under concurrency.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_concurrency,
+            pool_block=True,
+            # Retry transient 429/5xx responses up to 3 times, sleeping 0.5s, 1s then 2s,
+            # or for exactly as long as the server asks via Retry-After. Retries count
+            # against the per-minute limit too, so each one is paced like a new request.
+            max_retries=PacedRetry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=frozenset(['POST']),
+                respect_retry_after_header=True,
+                before_retry=self._count_request
+            )
+        )
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.headers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the underlying HTTP session and cache"""
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def _post(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a GraphQL document over the shared session
+
+        Uses automatic persisted queries: the document is first sent as its
+        SHA-256 hash only, and the full text is sent once if the server has not
+        seen it yet. Servers without persisted query support are detected on
+        the first request and get the full document from then on.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails
+        """
+        if self._persisted_queries is False:
+            return self._send({"query": query, "variables": variables})
+
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": _query_hash(query)}}
+        try:
+            data = self._send({"variables": variables, "extensions": extensions})
+            messages = {error.get('message') for error in data.get('errors') or []}
+        except requests.exceptions.HTTPError as e:
+            # Servers without persisted query support may reject a hash-only request outright
+            if self._persisted_queries is not None or e.response is None or e.response.status_code != 400:
+                raise
+            data, messages = None, {'PersistedQueryNotSupported'}
+        if not messages:
+            self._persisted_queries = True
+            return data
+
+        if 'PersistedQueryNotFound' in messages:
+            self._persisted_queries = True
+        elif self._persisted_queries is None or 'PersistedQueryNotSupported' in messages:
+            logger.info("Persisted queries not supported by the API, sending full queries")
+            self._persisted_queries = False
+        else:
+            return data  # Genuine error for a known query
+
+        # Send the full text once, registering it under its hash when supported
+        self._count_request()
+        payload = {"query": query, "variables": variables}
+        if self._persisted_queries:
+            payload["extensions"] = extensions
+        return self._send(payload)
+
+    def _send(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a GraphQL payload and return the decoded response"""
+        self.limiter.acquire()
+        started = time.monotonic()
+        ok = False
+        try:
+            # orjson encodes straight to bytes and decodes several times faster than the stdlib json
+            response = self.session.post(
+                self.base_url,
+                data=orjson.dumps(payload),
+                timeout=REQUEST_TIMEOUT
+            )
+            ok = not self._check_rate_limit_headers(response) and response.status_code < 500
+        except requests.exceptions.RetryError:
+            # Still 429/5xx after every retry; give the API a full window before the next request
+            self._pause(RATE_LIMIT_WINDOW)
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - started, ok)
+        response.raise_for_status()
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError as e:
+            raise requests.exceptions.InvalidJSONError(f"Invalid JSON in API response: {e}", response=response) from e
     
-    def _check_rate_limit(self):
-        """Check if we need to wait due to rate limiting"""
-        # Lansweeper API allows 150 requests per minute, but we will most likely not hit this limit if only this script is running
-        if self.request_count % 150 == 0 and self.request_count > 0:
-            logger.info(f"Reached {self.request_count} requests.")
-            choice = input("Press enter to continue processing, or 'q' to quit: ").strip()
-            if choice == 'q':
-                logger.info("User chose to quit processing.")
-                global quit_processing
-                quit_processing = True
-                return
+    def _check_rate_limit_headers(self, response: requests.Response) -> bool:
+        """
+        Slow down subsequent requests when the API signals we are at its rate limit
+
+        Returns:
+            True if the request was rate limited on the way
+        """
+        limited = False
+        retries = getattr(response.raw, 'retries', None)
+        if retries and any(attempt.status == 429 for attempt in retries.history):
+            logger.warning("Lansweeper API returned 429 Too Many Requests, slowing down")
+            self._pause(RATE_LIMIT_COOLDOWN)
+            limited = True
+        if response.headers.get('x-ratelimit-remaining') == '0':
+            # Reset is seconds until the window frees up; never wait longer than one window
+            reset = response.headers.get('x-ratelimit-reset', '')
+            self._pause(min(float(reset), RATE_LIMIT_WINDOW) if reset.replace('.', '', 1).isdigit() else RATE_LIMIT_COOLDOWN)
+        return limited
+
+    def _pause(self, seconds: float):
+        """Hold back every request made in the next `seconds` seconds"""
+        with self._request_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _pace(self):
+        """Sleep just long enough to stay under the API's per-minute request limit"""
+        wait = self._paused_until - time.monotonic()
+        if wait > 0:
+            logger.info(f"Rate limited by the API, waiting {wait:.1f}s")
+            time.sleep(wait)
+        # Sliding window of request timestamps over the last minute
+        now = time.monotonic()
+        while self._request_times and now - self._request_times[0] >= RATE_LIMIT_WINDOW:
+            self._request_times.popleft()
+        if len(self._request_times) >= RATE_LIMIT_REQUESTS:
+            wait = RATE_LIMIT_WINDOW - (now - self._request_times[0])
+            logger.info(f"Reached {RATE_LIMIT_REQUESTS} requests in the last minute, waiting {wait:.1f}s")
+            time.sleep(wait)
+            self._request_times.popleft()
+        self._request_times.append(time.monotonic())
+
+    def _count_request(self):
+        """Pace and count a request; safe to call from worker threads"""
+        with self._request_lock:
+            self._pace()
+            self.request_count += 1
 
     def get_asset_by_serial(self, serial_number: str) -> Optional[Dict[str, Any]]:
         """
@@ -57,66 +398,238 @@ class LansweeperAPI:
             serial_number: The serial number to search for
             
         Returns:
-            Asset data dictionary or None if not found
+            assetResources dictionary with 'total' and 'items', or None if the lookup failed
         """
-        self._check_rate_limit()
-        self.request_count += 1
-        
-        query = """
-        query GetAssetBySerial($siteId: ID!, $serialNumber: String!) {
-            site(id: $siteId) {
-                assetResources(
-                    assetPagination: { limit: 10 }
-                    filters: {
-                        conditions: [{
-                            path: "assetCustom.serialNumber"
-                            operator: EQUAL
-                            value: $serialNumber
-                        }]
-                    }
-                    fields: [
-                        "key"
-                        "assetBasicInfo.name"
-                        "assetCustom.barCode"
-                        "assetCustom.serialNumber"
-                        "assetCustom.purchaseDate"
-                        "assetCustom.warrantyDate"
-                        "url"
-                    ]
-                ) {
-                    total
-                    items
-                }
-            }
-        }
+        result = self.get_assets_by_serials([serial_number]).get(serial_number)
+        if result is None:
+            return None
+        return {'total': len(result['items']), 'items': result['items']}
+
+    def get_assets_by_serials(self, serial_numbers: List[str], batch_size: int = LOOKUP_BATCH_SIZE,
+                              in_batch_size: int = IN_FILTER_BATCH_SIZE) -> Dict[str, Optional[Dict[str, Any]]]:
         """
-        
-        variables = {
-            "siteId": self.site_id,
-            "serialNumber": serial_number
-        }
-        
+        Retrieve asset information for many serial numbers, in batches
+
+        Serial numbers are matched with a single IN filter per request where
+        the API supports it; otherwise each serial gets its own aliased EQUAL
+        lookup. Batches are fetched concurrently from a small thread pool.
+
+        Args:
+            serial_numbers: The serial numbers to search for
+            batch_size: Number of serial numbers looked up per aliased GraphQL request
+            in_batch_size: Number of serial numbers looked up per IN-filtered GraphQL request
+
+        Returns:
+            Dictionary mapping each serial number to its assetResources result
+            (see _get_assets_batch) or None if the lookup failed
+        """
+        if self._in_filter is not False:
+            results = self._get_assets_in_filtered(serial_numbers, batch_size, in_batch_size)
+            if results is not None:
+                return results
+
+        batches = [serial_numbers[start:start + batch_size] for start in range(0, len(serial_numbers), batch_size)]
+        if len(batches) <= 1:
+            return self._get_assets_batch(batches[0]) if batches else {}
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.lookup_workers) as executor:
+            for batch_result in executor.map(self._get_assets_batch, batches):
+                results.update(batch_result)
+        return results
+
+    def _get_assets_in_filtered(self, serial_numbers: List[str], batch_size: int, in_batch_size: int) -> Optional[Dict[str, Optional[Dict[str, Any]]]]:
+        """
+        Retrieve asset information with IN-filtered requests, in_batch_size serials each
+
+        Args:
+            serial_numbers: The serial numbers to search for
+            batch_size: Aliased batch size for chunks that have to fall back
+            in_batch_size: Number of serial numbers per IN-filtered request
+
+        Returns:
+            Same mapping as get_assets_by_serials, or None if the API turned out
+            not to support IN filters before anything was fetched
+        """
+        results = {}
+        if self.cache:
+            # One query per chunk keeps the SQL variable count bounded like the requests
+            for start in range(0, len(serial_numbers), in_batch_size):
+                results.update(self.cache.get_many(serial_numbers[start:start + in_batch_size]))
+            serial_numbers = [serial_number for serial_number in serial_numbers if serial_number not in results]
+        if not serial_numbers:
+            return results
+
+        chunks = [serial_numbers[start:start + in_batch_size] for start in range(0, len(serial_numbers), in_batch_size)]
+        # The first chunk runs alone so IN support is known before fanning out
+        first = self._get_assets_in_batch(chunks[0])
+        if first is None:
+            return None
+        results.update(first)
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.lookup_workers) as executor:
+                for chunk, chunk_result in zip(chunks[1:], executor.map(self._get_assets_in_batch, chunks[1:])):
+                    if chunk_result is not None:
+                        results.update(chunk_result)
+                        continue
+                    # Look the chunk up with aliased queries instead
+                    for start in range(0, len(chunk), batch_size):
+                        results.update(self._get_assets_batch(chunk[start:start + batch_size]))
+        return results
+
+    def _get_assets_in_batch(self, serial_numbers: List[str]) -> Optional[Dict[str, Optional[Dict[str, Any]]]]:
+        """
+        Retrieve the assets matching several serial numbers with one IN filter, following the pagination cursor
+
+        Args:
+            serial_numbers: The serial numbers to search for
+
+        Returns:
+            Dictionary mapping each serial number to {'items': [...]} (several
+            items if the serial is duplicated) or None if the lookup failed,
+            or None overall if the API does not support IN filters
+        """
+        failed = {serial_number: None for serial_number in serial_numbers}
+        items_by_serial = {}
+        page, cursor = 'FIRST', None
+        while True:
+            self._count_request()
+            try:
+                data = self._post(_in_filter_query(ALL_ASSETS_PAGE_SIZE, page), {"siteId": self.site_id, "serials": serial_numbers, "cursor": cursor})
+            except requests.exceptions.HTTPError as e:
+                if self._in_filter is None and e.response is not None and e.response.status_code == 400:
+                    return self._disable_in_filter()
+                logger.error(f"Request failed for batch of {len(serial_numbers)} serials: {e}")
+                return failed
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Request failed for batch of {len(serial_numbers)} serials: {e}")
+                return failed
+            if 'errors' in data:
+                if self._in_filter is None:
+                    return self._disable_in_filter()
+                logger.error(f"GraphQL errors for batch of {len(serial_numbers)} serials: {data['errors']}")
+                return failed
+            self._in_filter = True
+            try:
+                resources = data['data']['site']['assetResources']
+                for item in resources['items']:
+                    # Group case-insensitively, as the server matches; EQUAL lookups return the same assets
+                    serial_number = (item.get('assetCustom') or {}).get('serialNumber')
+                    if serial_number:
+                        items_by_serial.setdefault(str(serial_number).strip().casefold(), []).append(item)
+                cursor = resources['pagination']['next']
+            except (KeyError, TypeError) as e:
+                logger.error(f"Unexpected response structure for batch of {len(serial_numbers)} serials: {e}")
+                return failed
+            if not resources['items'] or not cursor:
+                break
+            page = 'NEXT'
+
+        results = {serial_number: {'items': items_by_serial.get(serial_number.strip().casefold(), [])} for serial_number in serial_numbers}
+        if self.cache:
+            self.cache.put_many(results)
+        return results
+
+    def _disable_in_filter(self) -> None:
+        """Remember that the API rejects IN filters so lookups use aliased EQUAL filters from now on"""
+        logger.info("IN filters not supported by the API, looking serial numbers up with aliased queries")
+        self._in_filter = False
+        return None
+
+    def _get_assets_batch(self, serial_numbers: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Retrieve asset information for several serial numbers in one request
+
+        Each serial gets its own aliased assetResources lookup inside a single
+        GraphQL document, so duplicate/missing detection works per serial.
+        Serials found in the persistent cache (if enabled) are not requested.
+
+        Args:
+            serial_numbers: The serial numbers to search for
+
+        Returns:
+            Dictionary mapping each serial number to its assetResources result
+            ({'items': [...]}, at most two items so duplicates can be
+            detected) or None if the lookup failed
+        """
+        results = {}
+        if self.cache:
+            results = self.cache.get_many(serial_numbers)
+            serial_numbers = [serial_number for serial_number in serial_numbers if serial_number not in results]
+        if not serial_numbers:
+            return results
+
+        self._count_request()
+
+        query = _lookup_query(len(serial_numbers))
+
+        variables = {"siteId": self.site_id}
+        for i, serial_number in enumerate(serial_numbers):
+            variables[f"s{i}"] = serial_number
+
+        results.update((serial_number, None) for serial_number in serial_numbers)
         try:
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json={"query": query, "variables": variables}
-            )
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self._post(query, variables)
             if 'errors' in data:
-                logger.error(f"GraphQL errors for serial {serial_number}: {data['errors']}")
-                return None
-            return data['data']['site']['assetResources']
-                
+                logger.error(f"GraphQL errors for batch of {len(serial_numbers)} serials: {data['errors']}")
+                return results
+            site = data['data']['site']
+            for i, serial_number in enumerate(serial_numbers):
+                results[serial_number] = site[f"a{i}"]
+            if self.cache:
+                self.cache.put_many({serial_number: results[serial_number] for serial_number in serial_numbers})
+            return results
+
         except requests.exceptions.RequestException as e:
-            logger.error(f"Request failed for serial {serial_number}: {e}")
-            return None
+            logger.error(f"Request failed for batch of {len(serial_numbers)} serials: {e}")
+            return results
         except (KeyError, TypeError) as e:
-            logger.error(f"Unexpected response structure for serial {serial_number}: {e}")
-            return None
-    
+            logger.error(f"Unexpected response structure for batch of {len(serial_numbers)} serials: {e}")
+            return results
+
+    def fetch_all_assets(self, page_size: int = ALL_ASSETS_PAGE_SIZE) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Retrieve every asset on the site, page_size per request, following the pagination cursor
+
+        Cheaper than per-serial lookups when the spreadsheet covers most of the
+        site: one request per page_size assets instead of one per batch of serials.
+
+        Args:
+            page_size: Number of assets per page
+
+        Returns:
+            Dictionary mapping each stripped, casefolded serial number to
+            {'items': [...]} in the same shape as get_assets_by_serials (several
+            items if the serial is duplicated), or None if any page failed
+        """
+        assets_by_serial = {}
+        page, cursor = 'FIRST', None
+        while True:
+            self._count_request()
+            query = _all_assets_query(page_size, page)
+            try:
+                data = self._post(query, {"siteId": self.site_id, "cursor": cursor})
+                if 'errors' in data:
+                    logger.error(f"GraphQL errors fetching all assets: {data['errors']}")
+                    return None
+                resources = data['data']['site']['assetResources']
+                for item in resources['items']:
+                    serial_number = (item.get('assetCustom') or {}).get('serialNumber')
+                    if serial_number:
+                        # Keyed case-insensitively, as the server matches serial lookups
+                        assets_by_serial.setdefault(str(serial_number).strip().casefold(), {'items': []})['items'].append(item)
+                cursor = resources['pagination']['next']
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Request failed fetching all assets: {e}")
+                return None
+            except (KeyError, TypeError) as e:
+                logger.error(f"Unexpected response structure fetching all assets: {e}")
+                return None
+            if not resources['items'] or not cursor:
+                break
+            page = 'NEXT'
+        logger.info(f"Fetched {len(assets_by_serial)} serial numbers from Lansweeper")
+        return assets_by_serial
+
     def update_asset(self, asset_key: str, serial_number: str, fields_to_update: Dict[str, str]) -> bool:
         """
         Update asset information
@@ -129,46 +642,15 @@ class LansweeperAPI:
         Returns:
             True if successful, False otherwise
         """
-        self._check_rate_limit()
-        self.request_count += 1
+        self._count_request()
         
         if not fields_to_update:
             return True  # Nothing to update
         
-        # Build the custom fields update object
-        custom_fields = {}
-        for field_name, value in fields_to_update.items():
-            if field_name in ['purchaseDate', 'warrantyDate']:
-                # Convert to ISO 8601 DateTime format and wrap in ValueDateInput object
-                iso_date = parse_date(value, 'lansweeper')
-                if iso_date:
-                    custom_fields[field_name] = {"value": iso_date}
-            else:
-                # For other fields like barCode, use the value directly
-                custom_fields[field_name] = value
-
+        custom_fields = self._build_custom_fields(fields_to_update)
         if not custom_fields:
             return True  # Nothing to update after processing
         
-        mutation = """
-        mutation EditAsset($siteId: ID!, $key: ID!, $customFields: AssetCustomInput!) {
-            site(id: $siteId) {
-                editAsset(
-                    key: $key
-                    fields: {
-                        assetCustom: $customFields
-                    }
-                ) {
-                    assetCustom {
-                        purchaseDate
-                        warrantyDate
-                        barCode
-                    }
-                }
-            }
-        }
-        """
-        
         variables = {
             "siteId": self.site_id,
             "key": asset_key,
@@ -176,25 +658,137 @@ class LansweeperAPI:
         }
         
         try:
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json={"query": mutation, "variables": variables}
-            )
-            response.raise_for_status()
-
-            data = response.json()
+            data = self._post(_EDIT_ASSET_MUTATION, variables)
             if 'errors' in data:
                 logger.error(f"Update failed for Serial {serial_number}: {data['errors']}")
                 return False
 
             logger.info(f"Successfully updated Serial {serial_number} with fields: {list(fields_to_update.keys())}")
+            edited = ((data.get('data') or {}).get('site') or {}).get('editAsset')
+            self._refresh_cache({serial_number: (asset_key, edited)})
             return True
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Update request failed for Serial {serial_number}: {e}")
             return False
 
+    def update_assets_bulk(self, updates: List[Tuple[str, str, Dict[str, str]]]) -> List[bool]:
+        """
+        Update several assets in a single request
+
+        Each asset gets its own aliased editAsset mutation inside one GraphQL
+        document; errors are mapped back to the alias that raised them.
+
+        Args:
+            updates: List of (asset_key, serial_number, fields_to_update) tuples
+
+        Returns:
+            List of booleans, True where the matching update succeeded
+        """
+        results = [True] * len(updates)  # Updates with nothing to send count as successful
+        aliases = {}
+        variables = {"siteId": self.site_id}
+        for i, (asset_key, serial_number, fields_to_update) in enumerate(updates):
+            custom_fields = self._build_custom_fields(fields_to_update)
+            if not custom_fields:
+                continue
+            # Aliases are numbered consecutively so the document only depends on the batch size
+            j = len(aliases)
+            aliases[f"u{j}"] = i
+            variables[f"k{j}"] = asset_key
+            variables[f"c{j}"] = custom_fields
+
+        if not aliases:
+            return results
+
+        self._count_request()
+
+        mutation = _bulk_edit_mutation(len(aliases))
+
+        try:
+            data = self._post(mutation, variables)
+            site = (data.get('data') or {}).get('site') or {}
+            for error in data.get('errors', []):
+                path = error.get('path') or []
+                if len(path) > 1 and path[1] in aliases:
+                    i = aliases[path[1]]
+                    logger.error(f"Update failed for Serial {updates[i][1]}: {error}")
+                    results[i] = False
+                else:
+                    # Error not tied to a single asset, nothing in this batch can be trusted
+                    logger.error(f"Bulk update of {len(aliases)} assets failed: {error}")
+                    for i in aliases.values():
+                        results[i] = False
+            edited = {}
+            for alias, i in aliases.items():
+                if results[i] and site.get(alias) is None:
+                    results[i] = False
+                if results[i]:
+                    logger.info(f"Successfully updated Serial {updates[i][1]} with fields: {list(updates[i][2].keys())}")
+                    edited[updates[i][1]] = (updates[i][0], site[alias])
+            self._refresh_cache(edited)
+            return results
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Bulk update request failed for {len(aliases)} assets: {e}")
+            for i in aliases.values():
+                results[i] = False
+            return results
+
+    def _refresh_cache(self, edited: Dict[str, Tuple[str, Optional[Dict[str, Any]]]]):
+        """
+        Store the fields returned by editAsset mutations as the cached lookup result
+
+        The mutation selects the same assetCustom fields a lookup returns, so the
+        next run can reuse them instead of looking the asset up again.
+
+        Args:
+            edited: Serial number -> (asset_key, editAsset result) for each successful update
+        """
+        if not self.cache:
+            return
+        refreshed = {}
+        for serial_number, (asset_key, result) in edited.items():
+            if result and result.get('assetCustom') is not None:
+                refreshed[serial_number] = {'items': [{'key': asset_key, 'assetCustom': result['assetCustom']}]}
+            else:
+                self.cache.invalidate(serial_number)
+        self.cache.put_many(refreshed)
+
+    @staticmethod
+    def _build_custom_fields(fields_to_update: Dict[str, str]) -> Dict[str, Any]:
+        """Build the AssetCustomInput object for a set of field updates"""
+        custom_fields = {}
+        for field_name, value in fields_to_update.items():
+            if IS_DATE_FIELD.get(field_name, False):
+                # Convert to ISO 8601 DateTime format and wrap in ValueDateInput object
+                iso_date = parse_date(value, 'lansweeper')
+                if iso_date:
+                    custom_fields[field_name] = {"value": iso_date}
+            else:
+                # For other fields like barCode, use the value directly
+                custom_fields[field_name] = value
+        return custom_fields
+
+# Date formats tried by parse_date, most likely first (see prioritize_date_formats)
+_DATE_FORMATS = (
+    # Day/month-ambiguous formats; year-first dates are handled by _YMD_DATE_RE
+    '%m/%d/%Y',                   # 11/08/2024
+    '%d/%m/%Y',                   # 08/11/2024
+    '%m-%d-%Y',                   # 11-08-2024
+    '%d-%m-%Y',                   # 08-11-2024
+    # Excel date formats
+    '%m/%d/%y',                   # 11/8/24
+    '%d/%m/%y',                   # 8/11/24
+)
+
+# Year-first dates are unambiguous, so they are matched in one pass instead of trying strptime formats:
+# 2024-11-08, 2024/11/08, 2024-11-08 00:00:00, 2024-11-08T00:00:00Z (LS), 2024-11-08T00:00:00.000Z
+_YMD_DATE_RE = re.compile(
+    r'(\d{4})[-/](\d{1,2})[-/](\d{1,2})'
+    r'(?:[T ](\d{1,2}):(\d{2}):(\d{2})(?:\.\d+)?Z?)?'
+)
+
 def parse_date(date_str: str, output_fmt: str = 'normal') -> Optional[str]:
     """
     Parse date string and return in specified format
@@ -209,82 +803,166 @@ def parse_date(date_str: str, output_fmt: str = 'normal') -> Optional[str]:
     if is_empty(date_str):
         return None
     
-    # Convert to string if it's not already
-    date_str = str(date_str).strip()
+    # Handle pandas Timestamp / datetime objects directly
+    if hasattr(date_str, 'strftime'):
+        if output_fmt == 'lansweeper':
+            return date_str.strftime('%Y-%m-%dT%H:%M:%SZ')
+        else:  # normal
+            return date_str.strftime('%Y-%m-%d')
     
-    # Try different date formats
-    date_formats = [
-        # ISO formats (from GraphQL responses)
-        '%Y-%m-%dT%H:%M:%S.%fZ',      # 2024-11-08T00:00:00.000Z
-        '%Y-%m-%dT%H:%M:%SZ',         # 2024-11-08T00:00:00Z  LS currently uses this format
-        '%Y-%m-%d %H:%M:%S',          # 2024-11-08 00:00:00  xlsx uses this format
-        '%Y-%m-%dT%H:%M:%S',          # 2024-11-08T00:00:00
-        # Standard date formats
-        '%Y-%m-%d',                   # 2024-11-08
-        '%m/%d/%Y',                   # 11/08/2024
-        '%d/%m/%Y',                   # 08/11/2024
-        '%Y/%m/%d',                   # 2024/11/08
-        '%m-%d-%Y',                   # 11-08-2024
-        '%d-%m-%Y',                   # 08-11-2024
-        # Excel date formats
-        '%m/%d/%y',                   # 11/8/24
-        '%d/%m/%y',                   # 8/11/24
-    ]
-    
-    for fmt in date_formats:
+    # Convert to string if it's not already; the string form is hashable and cacheable
+    return _parse_date_cached(str(date_str).strip(), output_fmt)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_cached(date_str: str, output_fmt: str) -> Optional[str]:
+    """Parse a stripped date string; cached since sheets repeat the same dates across rows"""
+    # Fast path for ISO 8601 strings (Lansweeper responses, normalized sheet dates) using the C parser
+    if len(date_str) >= 10 and date_str[4] == '-' and date_str[7] == '-':
+        # YYYY-MM-DD and LS's YYYY-MM-DDTHH:MM:SSZ already start with the normal form;
+        # only the date part needs validating
+        if output_fmt == 'normal' and (len(date_str) == 10 or (len(date_str) == 20 and date_str[10] == 'T' and date_str[-1] == 'Z')):
+            try:
+                date.fromisoformat(date_str[:10])
+                return date_str[:10]
+            except ValueError:
+                pass
         try:
-            parsed_date = datetime.strptime(date_str, fmt)
-            if output_fmt == 'lansweeper':
-                return parsed_date.strftime('%Y-%m-%dT%H:%M:%SZ')
-            else:  # normal
-                return parsed_date.strftime('%Y-%m-%d')
+            iso_str = date_str[:-1] + '+00:00' if date_str.endswith('Z') else date_str
+            return _format_date(datetime.fromisoformat(iso_str), output_fmt)
+        except ValueError:
+            pass
+
+    match = _YMD_DATE_RE.fullmatch(date_str)
+    if match:
+        try:
+            return _format_date(datetime(*(int(part) for part in match.groups() if part is not None)), output_fmt)
+        except ValueError:
+            pass  # Out-of-range month/day, e.g. 2024-13-01
+
+    # Only the ambiguous month/day forms are left to strptime
+    for fmt in _DATE_FORMATS:
+        try:
+            return _format_date(datetime.strptime(date_str, fmt), output_fmt)
         except ValueError:
             continue
     
-    # Try to handle pandas Timestamp objects
-    try:
-        if hasattr(date_str, 'strftime'):
-            if output_fmt == 'lansweeper':
-                return date_str.strftime('%Y-%m-%dT%H:%M:%SZ')
-            else:  # normal
-                return date_str.strftime('%Y-%m-%d')
-    except:
-        pass
-    
     logger.warning(f"Could not parse date: {date_str}")
     return None
 
-def compare_values(spreadsheet_val, lansweeper_val, field_name: str) -> bool:
+def _format_date(parsed_date: datetime, output_fmt: str) -> str:
+    """Format a parsed date as YYYY-MM-DD ('normal') or ISO 8601 ('lansweeper')"""
+    if output_fmt == 'lansweeper':
+        return parsed_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+    else:  # normal
+        return parsed_date.strftime('%Y-%m-%d')
+
+def prioritize_date_formats(values: pd.Series, sample_size: int = 100):
+    """
+    Reorder _DATE_FORMATS so the formats used by this spreadsheet are tried first
+    
+    Args:
+        values: Spreadsheet date column(s) to sniff
+        sample_size: Number of non-empty string values to sample
+    """
+    global _DATE_FORMATS
+    sample = [str(v).strip() for v in values if isinstance(v, str) and not is_empty(v)][:sample_size]
+    if not sample:
+        return
+    hits = {}
+    for fmt in _DATE_FORMATS:
+        hits[fmt] = 0
+        for value in sample:
+            try:
+                datetime.strptime(value, fmt)
+                hits[fmt] += 1
+            except ValueError:
+                pass
+    # sorted() is stable, so formats with equal hit counts keep their original priority
+    _DATE_FORMATS = tuple(sorted(_DATE_FORMATS, key=lambda fmt: -hits[fmt]))
+    _parse_date_cached.cache_clear()
+
+def normalize_date_column(values: pd.Series) -> pd.Series:
     """
-    Compare values and return True if they match
+    Parse a whole spreadsheet date column in a few vectorized passes
     
     Args:
-        spreadsheet_val: Value from spreadsheet
-        lansweeper_val: Value from Lansweeper
-        field_name: Name of the field being compared
+        values: Spreadsheet column holding dates in any mix of types/formats
         
     Returns:
-        True if values match, False otherwise
+        Series of YYYY-MM-DD strings aligned with values, None where the value
+        is not a naive date cell or a string in a known format (callers fall
+        back to parse_date)
     """
-    # Handle None/empty values
-    if pd.isna(spreadsheet_val) and (lansweeper_val is None or lansweeper_val == ''):
-        return True
-    if pd.isna(spreadsheet_val) or (lansweeper_val is None or lansweeper_val == ''):
-        return False
-    
-    # For dates, normalize format
-    if 'date' in field_name.lower():
-        spreadsheet_date = parse_date(spreadsheet_val, 'normal')
-        lansweeper_date = parse_date(lansweeper_val, 'normal')
-        return spreadsheet_date == lansweeper_date
+    normalized = pd.Series([None] * len(values), index=values.index, dtype=object)
+
+    # Naive date/datetime cells (what Excel holds) are converted in one vectorized pass. Numbers
+    # and strings stay away from pd.to_datetime without a format: it reads numbers as nanoseconds
+    # since 1970 and guesses one format for every string from the first
+    is_datetime = values.map(
+        lambda value: isinstance(value, (date, datetime)) and not pd.isna(value) and getattr(value, 'tzinfo', None) is None
+    )
+    if is_datetime.any():
+        try:
+            # cache=True parses each distinct value once; sheets repeat the same dates across rows
+            parsed = pd.to_datetime(values[is_datetime], errors='coerce', cache=True)
+            hits = parsed.index[parsed.notna()]
+            normalized.loc[hits] = parsed.loc[hits].dt.strftime('%Y-%m-%d')
+        except (ValueError, TypeError, AttributeError) as e:
+            # e.g. mixed UTC offsets, left to parse_date
+            logger.warning(f"Could not parse column {values.name} in bulk, falling back to per-row parsing: {e}")
+
+    # Strings are parsed one explicit format at a time, in the same order parse_date tries them.
+    # The ISO 8601 pass only gets what _YMD_DATE_RE matches, as in parse_date, since pandas alone
+    # also takes '2024', '2024-11' or '20241108'; those strings are UTC ('Z') or naive, so utc=True
+    # keeps their date and lets a column mix both. What is still unparsed is left to parse_date
+    is_string = values.map(lambda value: isinstance(value, str)) & ~empty_mask(values)
+    if not is_string.any():
+        return normalized
+    remaining = values[is_string].str.strip()
+    for fmt in ('ISO8601', *_DATE_FORMATS):
+        candidates = remaining[remaining.str.fullmatch(_YMD_DATE_RE.pattern)] if fmt == 'ISO8601' else remaining
+        if candidates.empty:
+            continue
+        try:
+            retried = pd.to_datetime(candidates, format=fmt, errors='coerce', cache=True, utc=fmt == 'ISO8601')
+            hits = retried.index[retried.notna()]
+            normalized.loc[hits] = retried.loc[hits].dt.strftime('%Y-%m-%d')
+        except (ValueError, TypeError, AttributeError):
+            continue  # left to parse_date
+        remaining = remaining.drop(hits)
+    return normalized
+
+def lansweeper_frame(serial_numbers: pd.Series, assets_by_serial: Dict[str, Optional[Dict[str, Any]]]) -> pd.DataFrame:
+    """
+    Line up the Lansweeper custom fields with the spreadsheet rows
     
-    # For other fields, do string comparison
-    return str(spreadsheet_val).strip() == str(lansweeper_val).strip()
+    Args:
+        serial_numbers: Spreadsheet serial number column
+        assets_by_serial: Lookup results keyed by serial number
+        
+    Returns:
+        DataFrame indexed like serial_numbers with barCode, purchaseDate and
+        warrantyDate columns; None where the row has no single matching asset
+    """
+    records = []
+    for serial_number in serial_numbers:
+        result = None if is_empty(serial_number) else assets_by_serial.get(str(serial_number))
+        if result and len(result['items']) == 1:
+            records.append(result['items'][0].get('assetCustom') or {})
+        else:
+            records.append({})
+    return pd.DataFrame.from_records(
+        records, index=serial_numbers.index, columns=['barCode', 'purchaseDate', 'warrantyDate']
+    ).astype(object)
 
 def is_empty(value) -> bool:
     """Check if a value is empty/null"""
     return pd.isna(value) or value == '' or value is None or str(value).strip() == ''
 
+def empty_mask(values: pd.Series) -> pd.Series:
+    """Vectorized is_empty: True where a value is null or blank"""
+    return values.isna() | values.astype(str).str.strip().eq('')
+
 def get_user_choice(serial_number: str, field_name: str, spreadsheet_val: str, lansweeper_val: str) -> str:
     """
     Get user choice for handling conflicting values
@@ -315,6 +993,97 @@ def get_user_choice(serial_number: str, field_name: str, spreadsheet_val: str, l
         else:
             print("Invalid choice. Please enter 1, 2, 3, or 4.")
 
+@functools.lru_cache(maxsize=None)
+def _query_hash(query: str) -> str:
+    """SHA-256 hash identifying a GraphQL document for persisted queries"""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def _lookup_query(count: int) -> str:
+    """GraphQL document looking up count serial numbers ($s0..) under aliases a0.."""
+    variable_defs = ", ".join(f"$s{i}: String!" for i in range(count))
+    lookups = "".join(_ASSET_LOOKUP.format(i=i) for i in range(count))
+    return f"query GetAssetsBySerial($siteId: ID!, {variable_defs}) {{\n    site(id: $siteId) {{{lookups}\n    }}\n}}\n"
+
+@functools.lru_cache(maxsize=None)
+def _bulk_edit_mutation(count: int) -> str:
+    """GraphQL document editing count assets ($k0/$c0..) under aliases u0.."""
+    variable_defs = ", ".join(f"$k{i}: ID!, $c{i}: AssetCustomInput!" for i in range(count))
+    edits = "".join(_ASSET_EDIT.format(i=i) for i in range(count))
+    return f"mutation EditAssets($siteId: ID!, {variable_defs}) {{\n    site(id: $siteId) {{{edits}\n    }}\n}}\n"
+
+@functools.lru_cache(maxsize=None)
+def _in_filter_query(page_size: int, page: str) -> str:
+    """GraphQL document fetching one FIRST/NEXT page of the assets matching $serials"""
+    return _ASSETS_IN_QUERY.format(page_size=page_size, page=page)
+
+@functools.lru_cache(maxsize=None)
+def _all_assets_query(page_size: int, page: str) -> str:
+    """GraphQL document fetching one FIRST/NEXT page of every asset on the site"""
+    return _ALL_ASSETS_QUERY.format(page_size=page_size, page=page)
+
+def report_section(heading: str, entries: List[str], separator: str = "\n\n", trailer: str = "") -> List[str]:
+    """
+    Build one titled section of the discrepancy report
+    
+    Args:
+        heading: Section title line(s), newline terminated
+        entries: Newline-terminated report lines
+        separator: Text written before the section banner
+        trailer: Text written after the last entry
+        
+    Returns:
+        The section's text pieces, in order
+    """
+    return [separator + "=" * 40 + "\n", heading, "=" * 40 + "\n", *entries, trailer]
+
+def record_ls_updates(pending_updates: List[Tuple[str, str, Dict[str, str]]], results: List[bool], ls_changes: List[str]):
+    """
+    Record the outcome of each update sent by LansweeperAPI.update_assets_bulk
+
+    Args:
+        pending_updates: List of (asset_key, serial_number, fields_to_update) tuples
+        results: Success flag for each entry of pending_updates
+        ls_changes: Report lines to append the results to
+    """
+    for (_, serial_number, ls_updates), success in zip(pending_updates, results):
+        if success:
+            update_summary = ", ".join([f"{k}='{v}'" for k, v in ls_updates.items()])
+            ls_changes.append(f"UPDATED LS for Serial {serial_number}: {update_summary}\n")
+            logger.info(f"Successfully updated LS for Serial {serial_number}: {update_summary}")
+        else:
+            ls_changes.append(f"FAILED to update LS for Serial {serial_number}: {ls_updates}\n")
+            logger.error(f"Failed to update LS for Serial {serial_number}: {ls_updates}")
+
+def save_sheet_patch(df: pd.DataFrame, sheet_patch: Dict[str, Dict[Any, str]], path: str, change_count: int):
+    """
+    Apply the staged spreadsheet updates, one assignment per column, and save the spreadsheet
+
+    Args:
+        df: Spreadsheet data, updated in place
+        sheet_patch: New values by column, then by row index; cleared once applied
+        path: Spreadsheet file to write
+        change_count: Number of changes being saved
+    """
+    for column, values in sheet_patch.items():
+        if not values:
+            continue
+        if IS_DATE_FIELD[column]:
+            # Dates go in as Timestamps so they are saved as Excel dates rather than text
+            new_values = pd.to_datetime(list(values.values()), format='%Y-%m-%d')
+            if not pd.api.types.is_datetime64_any_dtype(df[column]):
+                df[column] = df[column].astype(object)
+        else:
+            # object dtype keeps the new text values from being coerced
+            new_values = list(values.values())
+            df[column] = df[column].astype(object)
+        df.loc[list(values), column] = new_values
+        values.clear()
+
+    logger.info(f"Saving {change_count} changes to spreadsheet...")
+    # xlsxwriter streams the sheet out instead of building an openpyxl cell tree
+    df.to_excel(path, index=False, engine='xlsxwriter')
+
 def main():
     global quit_processing
     # Load configuration from environment variables
@@ -324,6 +1093,12 @@ def main():
     DISCREPANCIES_FILE = os.getenv('DISCREPANCIES_FILE', 'discrepancies.txt')  # Default filename
     BARCODE_LENGTH = int(os.getenv('BARCODE_LENGTH')) # Optionally set barcode length for validation during script process
     BARCODE_PREFIX = int(os.getenv('BARCODE_PREFIX')) # Optionally set barcode prefix for validation during script process
+    ASSET_CACHE_TTL = float(os.getenv('ASSET_CACHE_TTL', '0'))  # Seconds to reuse lookups across runs, 0 disables the cache
+    ASSET_CACHE_PATH = os.getenv('ASSET_CACHE_PATH', 'lansweeper_cache.sqlite')
+    FETCH_ALL_ASSETS = os.getenv('FETCH_ALL_ASSETS', '').lower() in ('1', 'true', 'yes')  # Pull every asset on the site instead of looking up serials
+    WORKERS = int(os.getenv('LOOKUP_WORKERS', LOOKUP_WORKERS))  # Lookup requests in flight at once; the pacer still caps requests per minute
+    LOOKUP_BATCH = int(os.getenv('LOOKUP_BATCH_SIZE', LOOKUP_BATCH_SIZE))  # Serial numbers per aliased lookup request, lower it if the API rejects large documents
+    IN_FILTER_BATCH = int(os.getenv('IN_FILTER_BATCH_SIZE', IN_FILTER_BATCH_SIZE))  # Serial numbers per IN-filtered lookup request, when the API supports IN
 
     # Validate required environment variables
     if not SITE_ID:
@@ -336,18 +1111,26 @@ def main():
     
     
     # Initialize API client
-    api = LansweeperAPI(SITE_ID, PAT_TOKEN)
+    cache = AssetCache(ASSET_CACHE_PATH, SITE_ID, ASSET_CACHE_TTL) if ASSET_CACHE_TTL > 0 else None
+    api = LansweeperAPI(SITE_ID, PAT_TOKEN, cache, lookup_workers=WORKERS)
     
     try:
         # Read the spreadsheet
         logger.info(f"Reading spreadsheet: {SPREADSHEET_PATH}")
-        df = pd.read_excel(SPREADSHEET_PATH)
+        # calamine (Rust) parses xlsx much faster than openpyxl. Identifiers are read as object so
+        # every cell keeps the value it was read with (text serials keep leading zeros, numbers are
+        # not turned into floats) and is saved back unchanged; text copies are made below
+        df = pd.read_excel(
+            SPREADSHEET_PATH,
+            engine='calamine',
+            dtype={'Serial Number': object, 'Barcode Number': object}
+        )
 
         # Verify required columns exist
         required_columns = ['Serial Number', 'Barcode Number', 'Invoice Date', 'Extended Warranty']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = set(required_columns) - set(df.columns)
         if missing_columns:
-            raise ValueError(f"Missing required columns: {missing_columns}")
+            raise ValueError(f"Missing required columns: {sorted(missing_columns)}")
         
         # Track changes made to spreadsheet
         spreadsheet_changes = []
@@ -357,89 +1140,170 @@ def main():
         duplicate_assets = []
         conflict_info = []
         conflicts_for_review = []
+        pending_updates = []
+        # Conflicts found in the first pass, prompted for once every row has been checked
+        pending_conflicts = []
+        # Spreadsheet cell updates by column, applied to df in one assignment per column after the loop
+        sheet_patch = {'Barcode Number': {}, 'Invoice Date': {}, 'Extended Warranty': {}}
         quit_processing = False
+
+        # Try this sheet's date formats first when falling back to parse_date
+        prioritize_date_formats(pd.concat([df['Invoice Date'], df['Extended Warranty']]))
+
+        # Normalize spreadsheet dates once per column instead of per row
+        purchase_dates = normalize_date_column(df['Invoice Date'])
+        warranty_dates = normalize_date_column(df['Extended Warranty'])
+
+        # Look up all assets up front, one request per batch of serial numbers (or per page of the whole
+        # site with FETCH_ALL_ASSETS, falling back to batched lookups if paging fails)
+        sheet_serials = df['Serial Number'].map(lambda serial_number: serial_number if is_empty(serial_number) else str(serial_number))
+        serials = list(dict.fromkeys(sn for sn in sheet_serials if not is_empty(sn)))
+        all_assets = api.fetch_all_assets() if FETCH_ALL_ASSETS else None
+        if all_assets is not None:
+            # Diff against the whole site in memory; serials absent from it were not found
+            assets_by_serial = {serial_number: all_assets.get(serial_number.strip().casefold(), {'items': []}) for serial_number in serials}
+        else:
+            assets_by_serial = api.get_assets_by_serials(serials, batch_size=LOOKUP_BATCH, in_batch_size=IN_FILTER_BATCH)
+        logger.info(f"Retrieved {len(serials)} serial numbers from Lansweeper in {api.request_count} requests")
+
+        # Find rows already in sync with column algebra so the loop can skip their field checks.
+        # Barcodes are preprocessed into stripped strings ('' when empty) so the loop compares them with ==;
+        # a trailing '.0' left by numeric cells is dropped so 12345.0 matches 12345
+        ls_frame = lansweeper_frame(sheet_serials, assets_by_serial)
+        sheet_barcodes = df['Barcode Number'].fillna('').astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+        ls_barcodes = ls_frame['barCode'].fillna('').astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+        # Lansweeper dates are normalized for the whole run in one pass, like the spreadsheet's
+        ls_purchase_dates = normalize_date_column(ls_frame['purchaseDate'])
+        ls_warranty_dates = normalize_date_column(ls_frame['warrantyDate'])
+        in_sync = (
+            sheet_barcodes.ne('') & sheet_barcodes.eq(ls_barcodes)
+            & purchase_dates.notna() & purchase_dates.eq(ls_purchase_dates)
+            & warranty_dates.notna() & warranty_dates.eq(ls_warranty_dates)
+        )
         
-        # Open discrepancies file
-        with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-            discrepancy_file.write("\n" + "=" * 80 + "\n")
-            discrepancy_file.write(f"Asset Discrepancy Report - Generated: {datetime.now()}\n")
-            discrepancy_file.write("=" * 80 + "\n\n")
+        # The report is collected in memory and written to the discrepancies file once at the end
+        report_header = "\n" + "=" * 80 + "\n" + f"Asset Discrepancy Report - Generated: {datetime.now()}\n" + "=" * 80 + "\n\n"
+
+        # Phase 1 checks every row without prompting. Bulk updates run on a background worker so
+        # network I/O overlaps with the conflict prompts; a single worker keeps updates to the same
+        # asset in order
+        with ThreadPoolExecutor(max_workers=1) as update_executor:
+            update_batches = []
             
-            # Process each row
-            for index, row in df.iterrows():
-                if quit_processing:
-                    break
-                    
-                serial_number = row['Serial Number']
-                if is_empty(serial_number):
-                    logger.warning(f"Skipping row {index + 1}: No serial number")
-                    continue
-                
-                logger.info(f"Processing serial number: {serial_number}")
+            # Process each row from one pre-normalized frame; itertuples yields plain tuples
+            # rather than boxing every row into a Series
+            row_frame = pd.DataFrame({
+                'serial': sheet_serials,
+                'barcode': sheet_barcodes,
+                'ls_barcode': ls_barcodes,
+                'purchase': purchase_dates,
+                'raw_purchase': df['Invoice Date'],
+                'ls_purchase': ls_purchase_dates,
+                'warranty': warranty_dates,
+                'raw_warranty': df['Extended Warranty'],
+                'ls_warranty': ls_warranty_dates,
+                'in_sync': in_sync,
+                # Emptiness of each field, computed column-wide instead of is_empty per cell
+                'barcode_empty': sheet_barcodes.eq(''),
+                'ls_barcode_empty': ls_barcodes.eq(''),
+                'purchase_empty': empty_mask(df['Invoice Date']),
+                'ls_purchase_empty': empty_mask(ls_frame['purchaseDate']),
+                'warranty_empty': empty_mask(df['Extended Warranty']),
+                'ls_warranty_empty': empty_mask(ls_frame['warrantyDate'])
+            }, index=df.index)
+
+            # Rows without a serial number are reported up front and never reach the loop
+            serial_empty = empty_mask(sheet_serials)
+            for index in df.index[serial_empty]:
+                logger.warning("Skipping row %s: No serial number", index + 1)
+            row_frame = row_frame[~serial_empty]
+
+            for (index, serial_number, spreadsheet_barcode, ls_barcode, spreadsheet_purchase_date, raw_purchase_date, ls_purchase_date,
+                 spreadsheet_warranty_date, raw_warranty_date, ls_warranty_date, row_in_sync,
+                 barcode_empty, ls_barcode_empty, purchase_empty, ls_purchase_empty, warranty_empty, ls_warranty_empty) in row_frame.itertuples(index=True, name=None):
+                logger.debug("Processing serial number: %s", serial_number)
                 
                 # Get asset from Lansweeper, check for correct number (1)
-                asset = api.get_asset_by_serial(str(serial_number))
-                if asset['total'] == 0:
+                asset = assets_by_serial.get(str(serial_number))
+                if asset is None:
+                    logger.error("Lookup failed for serial number: %s", serial_number)
+                    continue
+                elif len(asset['items']) == 0:
                     missing_assets.append(f"ERROR: Asset not found for serial number: {serial_number}\n")
-                    logger.error(f"Asset not found for serial number: {serial_number}")
+                    logger.error("Asset not found for serial number: %s", serial_number)
                     continue
-                elif asset['total'] > 1:
+                elif len(asset['items']) > 1:
                     duplicate_assets.append(f"WARNING: Multiple assets found for serial number: {serial_number}.\n")
-                    logger.warning(f"Multiple assets found for serial number: {serial_number}.")
+                    logger.warning("Multiple assets found for serial number: %s.", serial_number)
                     continue
                 else:
                     asset = asset['items'][0]
 
-                logger.info(f"Retrieved asset for serial {serial_number}: {asset['assetBasicInfo']['name']}")
+                logger.debug("Retrieved asset for serial %s: %s", serial_number, asset['key'])
 
                 # Extract values
                 barcode_issues = False
 
-                ls_barcode = asset['assetCustom'].get('barCode', '') if asset.get('assetCustom') else ''
                 # catch case where LS barcode isn't number and log accordingly
-                if not is_empty(ls_barcode):
+                if not ls_barcode_empty:
                     try:
                         int(ls_barcode)
-                        if (BARCODE_LENGTH and len(str(ls_barcode).strip()) != BARCODE_LENGTH) or (BARCODE_PREFIX and not str(ls_barcode).strip().startswith(str(BARCODE_PREFIX))):
+                        if (BARCODE_LENGTH and len(ls_barcode) != BARCODE_LENGTH) or (BARCODE_PREFIX and not ls_barcode.startswith(str(BARCODE_PREFIX))):
                             barcode_issues = True
                             conflicts_for_review.append(f"Serial {serial_number} - Invalid LS Barcode Format (based on specified length and prefix) - LS: '{ls_barcode}'\n")
                     except Exception:
                         barcode_issues = True
                         conflicts_for_review.append(f"Serial {serial_number} - Invalid LS Barcode Format (not a number) - LS: '{ls_barcode}'\n")
 
-                ls_purchase_date = asset['assetCustom'].get('purchaseDate', '') if asset.get('assetCustom') else ''
-                ls_warranty_date = asset['assetCustom'].get('warrantyDate', '') if asset.get('assetCustom') else ''
+                # LS dates pandas could not parse keep their raw value and go through parse_date
+                if ls_purchase_date is None:
+                    ls_purchase_date = asset['assetCustom'].get('purchaseDate', '') if asset.get('assetCustom') else ''
+                if ls_warranty_date is None:
+                    ls_warranty_date = asset['assetCustom'].get('warrantyDate', '') if asset.get('assetCustom') else ''
                 
-                # truncate barcode from decimal to int then convert to string, try-except to catch cases where spreadsheet barcode isn't a number and log accordingly
-                spreadsheet_barcode = row['Barcode Number']
-                if not is_empty(spreadsheet_barcode):
+                # spreadsheet barcode is read as text and already stripped, try-except to catch cases where it isn't a number and log accordingly
+                if not barcode_empty:
                     try:
                         int(spreadsheet_barcode)
-                        if (BARCODE_LENGTH and len(str(spreadsheet_barcode).strip()) != BARCODE_LENGTH) or (BARCODE_PREFIX and not str(spreadsheet_barcode).strip().startswith(str(BARCODE_PREFIX))):
+                        if (BARCODE_LENGTH and len(spreadsheet_barcode) != BARCODE_LENGTH) or (BARCODE_PREFIX and not spreadsheet_barcode.startswith(str(BARCODE_PREFIX))):
                             barcode_issues = True
                             conflicts_for_review.append(f"Serial {serial_number} - Invalid Sheet Barcode Format (based on specified length and prefix) - Sheet: '{spreadsheet_barcode}'\n")
                     except Exception:
                         barcode_issues = True
                         conflicts_for_review.append(f"Serial {serial_number} - Invalid Sheet Barcode Format (not a number) - Sheet: '{spreadsheet_barcode}'\n")
-                spreadsheet_purchase_date = row['Invoice Date']
-                spreadsheet_warranty_date = row['Extended Warranty']
+
+                # All fields present and matching on both sides, nothing to reconcile
+                if row_in_sync:
+                    continue
+
+                # Dates pandas could not parse keep their raw value and go through parse_date
+                if spreadsheet_purchase_date is None:
+                    spreadsheet_purchase_date = raw_purchase_date
+                if spreadsheet_warranty_date is None:
+                    spreadsheet_warranty_date = raw_warranty_date
 
                 # Track updates needed for LS
                 ls_updates = {}
                 
                 # Process each field
                 fields_to_process = [
-                    ('Barcode Number', 'barCode', spreadsheet_barcode, ls_barcode),
-                    ('Invoice Date', 'purchaseDate', spreadsheet_purchase_date, ls_purchase_date),
-                    ('Extended Warranty', 'warrantyDate', spreadsheet_warranty_date, ls_warranty_date)
+                    ('Barcode Number', 'barCode', spreadsheet_barcode, ls_barcode, barcode_empty, ls_barcode_empty),
+                    ('Invoice Date', 'purchaseDate', spreadsheet_purchase_date, ls_purchase_date, purchase_empty, ls_purchase_empty),
+                    ('Extended Warranty', 'warrantyDate', spreadsheet_warranty_date, ls_warranty_date, warranty_empty, ls_warranty_empty)
                 ]
                 
-                for field_display_name, field_ls_name, sheet_val, ls_val in fields_to_process:
-                    if quit_processing:
-                        break
-                        
-                    sheet_empty = is_empty(sheet_val)
-                    ls_empty = is_empty(ls_val)
+                for field_display_name, field_ls_name, sheet_val, ls_val, sheet_empty, ls_empty in fields_to_process:
+                    # Identical values on both sides need neither normalizing nor comparing
+                    if not sheet_empty and not ls_empty and sheet_val == ls_val:
+                        continue
+
+                    # Normalize each side once and reuse it for the comparison, updates and report lines;
+                    # barcodes were already normalized to stripped strings column-wide
+                    is_date_field = IS_DATE_FIELD[field_ls_name]
+                    if not sheet_empty:
+                        normalized_sheet_val = parse_date(sheet_val, 'normal') if is_date_field else sheet_val
+                    if not ls_empty:
+                        normalized_ls_val = parse_date(ls_val, 'normal') if is_date_field else ls_val
 
                     # Note FOR FUTURE UPDATE: Should set validity checks for every field and use generic proceed logic
                     proceed = not (barcode_issues and field_ls_name == 'barCode')
@@ -447,148 +1311,135 @@ def main():
                         if sheet_empty and ls_empty:
                             # Both empty - log but continue
                             missing_info.append(f"Row {index + 1}: Serial {serial_number} - {field_display_name}: Both values are empty\n")
-                            logger.info(f"Serial {serial_number} - {field_display_name}: Both values are empty")
+                            logger.debug("Serial %s - %s: Both values are empty", serial_number, field_display_name)
                             
                         if sheet_empty and not ls_empty:
                             # Spreadsheet empty, LS has value - update spreadsheet
-                            normalized_ls_val = parse_date(ls_val, 'normal') if 'date' in field_ls_name.lower() else str(ls_val)
-                            df.at[index, field_display_name] = normalized_ls_val
+                            sheet_patch[field_display_name][index] = normalized_ls_val
                             spreadsheet_changes.append(f"Row {index + 1}: Serial {serial_number} - Updated {field_display_name} from empty to '{normalized_ls_val}'\n")
-                            logger.info(f"Serial {serial_number} - {field_display_name}: Updated spreadsheet from empty to '{normalized_ls_val}'")
+                            logger.debug("Serial %s - %s: Updated spreadsheet from empty to '%s'", serial_number, field_display_name, normalized_ls_val)
                             
                         if not sheet_empty and ls_empty:
                             # LS empty, spreadsheet has value - prepare to update LS
-                            normalized_sheet_val = parse_date(sheet_val, 'normal') if 'date' in field_ls_name.lower() else str(sheet_val)
                             ls_updates[field_ls_name] = normalized_sheet_val
                             ls_changes.append(f"Serial {serial_number} - {field_display_name}: Will update LS from empty to '{normalized_sheet_val}'\n")
-                            logger.info(f"Serial {serial_number} - {field_display_name}: Will update LS from empty to '{normalized_sheet_val}'")
+                            logger.debug("Serial %s - %s: Will update LS from empty to '%s'", serial_number, field_display_name, normalized_sheet_val)
                     
                     if not sheet_empty and not ls_empty:
-                        # Both have values - check if they match
-                        if not compare_values(sheet_val, ls_val, field_ls_name):
-                            # Values differ - get user input
-                            normalized_sheet_val = parse_date(sheet_val, 'normal') if 'date' in field_ls_name.lower() else str(sheet_val)
-                            normalized_ls_val = parse_date(ls_val, 'normal') if 'date' in field_ls_name.lower() else str(ls_val)
-                            
-                            logger.info(f"Serial {serial_number} - {field_display_name}: Conflict Detected")
-
-                            # Temporary override to always use sheet value for Invoice Date
-                            # if field_ls_name != 'purchaseDate':
-                            #     choice = get_user_choice(serial_number, field_display_name, normalized_sheet_val, normalized_ls_val)
-                            # else:
-                            #     choice = 'sheet_to_ls'
-                            choice = get_user_choice(serial_number, field_display_name, normalized_sheet_val, normalized_ls_val)
-
-                            if choice == 'quit':
-                                quit_processing = True
-                                logger.info("User chose to quit processing")
-                                break
-                            elif choice == 'ls_to_sheet':
-                                df.at[index, field_display_name] = normalized_ls_val
-                                if barcode_issues and field_ls_name == 'barCode':
-                                    conflicts_for_review.append(f"Serial {serial_number} - Barcode issues RESOLVED\n")
-                                conflict_info.append(f"Override Sheet with LS value: Serial {serial_number} - Updated {field_display_name} from '{normalized_sheet_val}' to '{normalized_ls_val}'\n")
-                                spreadsheet_changes.append(f"Row {index + 1}: Serial {serial_number} - Updated {field_display_name} from '{normalized_sheet_val}' to '{normalized_ls_val}'\n")
-                                logger.info(f"Serial {serial_number} - {field_display_name}: Updated spreadsheet from '{normalized_sheet_val}' to '{normalized_ls_val}'")
-                                
-                            elif choice == 'sheet_to_ls':
-                                ls_updates[field_ls_name] = normalized_sheet_val
-                                if barcode_issues and field_ls_name == 'barCode':
-                                    conflicts_for_review.append(f"Serial {serial_number} - Barcode issues RESOLVED\n")
-                                conflict_info.append(f"Override LS with Sheet value: Serial {serial_number} - Updated {field_display_name} from '{normalized_ls_val}' to '{normalized_sheet_val}'\n")
-                                ls_changes.append(f"Serial {serial_number} - {field_display_name}: Will update LS from '{normalized_ls_val}' to '{normalized_sheet_val}'\n")
-                                logger.info(f"Serial {serial_number} - {field_display_name}: Will update LS from '{normalized_ls_val}' to '{normalized_sheet_val}'")
-                                    
-                            else:  # skip
-                                conflicts_for_review.append(f"Serial {serial_number} - {field_display_name}: UNRESOLVED - Sheet: '{normalized_sheet_val}' vs LS: '{normalized_ls_val}'\n")
-                                logger.info(f"Serial {serial_number} - {field_display_name}: SKIPPED - values differ")
+                        # Both have values - check if they match; dates are YYYY-MM-DD strings (or None
+                        # if unparseable) and barcodes stripped strings, so both compare with ==
+                        if normalized_sheet_val != normalized_ls_val:
+                            # Values differ - ask the user once every row has been checked
+                            logger.debug("Serial %s - %s: Conflict Detected", serial_number, field_display_name)
+                            pending_conflicts.append((index, serial_number, asset['key'], field_display_name, field_ls_name, normalized_sheet_val, normalized_ls_val, barcode_issues))
                 
-                # Perform all LS updates for this row in one API call
-                if ls_updates and not quit_processing:
-                    success = api.update_asset(asset['key'], serial_number, ls_updates)
-                    if success:
-                        update_summary = ", ".join([f"{k}='{v}'" for k, v in ls_updates.items()])
-                        ls_changes.append(f"UPDATED LS for Serial {serial_number}: {update_summary}\n")
-                        logger.info(f"Successfully updated LS for Serial {serial_number}: {update_summary}")
-                    else:
-                        ls_changes.append(f"FAILED to update LS for Serial {serial_number}: {ls_updates}\n")
-                        logger.error(f"Failed to update LS for Serial {serial_number}: {ls_updates}")
-            if quit_processing:
-                discrepancy_file.write(f"\n=== PROCESSING STOPPED BY USER ===\n\n")
-        
-        # Save spreadsheet changes if any were made
+                # Queue all LS updates for this row, sent in bulk every UPDATE_BATCH_SIZE rows
+                if ls_updates:
+                    pending_updates.append((asset['key'], serial_number, ls_updates))
+                    if len(pending_updates) >= UPDATE_BATCH_SIZE:
+                        update_batches.append((pending_updates, update_executor.submit(api.update_assets_bulk, pending_updates)))
+                        pending_updates = []
+            if pending_updates:
+                update_batches.append((pending_updates, update_executor.submit(api.update_assets_bulk, pending_updates)))
+
+            # Save the Phase 1 spreadsheet fill-ins before prompting, so an interrupted Phase 2 cannot lose them
+            saved_changes = 0
+            if spreadsheet_changes and pending_conflicts:
+                save_sheet_patch(df, sheet_patch, SPREADSHEET_PATH, len(spreadsheet_changes))
+                saved_changes = len(spreadsheet_changes)
+
+            # Phase 2: resolve conflicts interactively while the non-conflicting updates are sent in the background
+            conflict_updates = {}
+            for position, (index, serial_number, asset_key, field_display_name, field_ls_name, normalized_sheet_val, normalized_ls_val, barcode_issues) in enumerate(pending_conflicts):
+                # Temporary override to always use sheet value for Invoice Date
+                # if field_ls_name != 'purchaseDate':
+                #     choice = get_user_choice(serial_number, field_display_name, normalized_sheet_val, normalized_ls_val)
+                # else:
+                #     choice = 'sheet_to_ls'
+                try:
+                    choice = get_user_choice(serial_number, field_display_name, normalized_sheet_val, normalized_ls_val)
+                except (KeyboardInterrupt, EOFError):
+                    # Ctrl-C at a prompt stops like 'quit', so the Lansweeper updates already sent are still reported
+                    print()
+                    choice = 'quit'
+
+                if choice == 'quit':
+                    quit_processing = True
+                    logger.info("User chose to quit processing")
+                    for _, serial_number, _, field_display_name, _, normalized_sheet_val, normalized_ls_val, _ in pending_conflicts[position:]:
+                        conflicts_for_review.append(f"Serial {serial_number} - {field_display_name}: UNRESOLVED - Sheet: '{normalized_sheet_val}' vs LS: '{normalized_ls_val}'\n")
+                    break
+                elif choice == 'ls_to_sheet':
+                    sheet_patch[field_display_name][index] = normalized_ls_val
+                    if barcode_issues and field_ls_name == 'barCode':
+                        conflicts_for_review.append(f"Serial {serial_number} - Barcode issues RESOLVED\n")
+                    conflict_info.append(f"Override Sheet with LS value: Serial {serial_number} - Updated {field_display_name} from '{normalized_sheet_val}' to '{normalized_ls_val}'\n")
+                    spreadsheet_changes.append(f"Row {index + 1}: Serial {serial_number} - Updated {field_display_name} from '{normalized_sheet_val}' to '{normalized_ls_val}'\n")
+                    logger.info("Serial %s - %s: Updated spreadsheet from '%s' to '%s'", serial_number, field_display_name, normalized_sheet_val, normalized_ls_val)
+                    
+                elif choice == 'sheet_to_ls':
+                    conflict_updates.setdefault((asset_key, serial_number), {})[field_ls_name] = normalized_sheet_val
+                    if barcode_issues and field_ls_name == 'barCode':
+                        conflicts_for_review.append(f"Serial {serial_number} - Barcode issues RESOLVED\n")
+                    conflict_info.append(f"Override LS with Sheet value: Serial {serial_number} - Updated {field_display_name} from '{normalized_ls_val}' to '{normalized_sheet_val}'\n")
+                    ls_changes.append(f"Serial {serial_number} - {field_display_name}: Will update LS from '{normalized_ls_val}' to '{normalized_sheet_val}'\n")
+                    logger.info("Serial %s - %s: Will update LS from '%s' to '%s'", serial_number, field_display_name, normalized_ls_val, normalized_sheet_val)
+                        
+                else:  # skip
+                    conflicts_for_review.append(f"Serial {serial_number} - {field_display_name}: UNRESOLVED - Sheet: '{normalized_sheet_val}' vs LS: '{normalized_ls_val}'\n")
+                    logger.info("Serial %s - %s: SKIPPED - values differ", serial_number, field_display_name)
+
+            # Send the LS updates chosen for conflicts, one field set per asset
+            conflict_updates = [(asset_key, serial_number, fields) for (asset_key, serial_number), fields in conflict_updates.items()]
+            for start in range(0, len(conflict_updates), UPDATE_BATCH_SIZE):
+                batch = conflict_updates[start:start + UPDATE_BATCH_SIZE]
+                update_batches.append((batch, update_executor.submit(api.update_assets_bulk, batch)))
+            for batch, future in update_batches:
+                record_ls_updates(batch, future.result(), ls_changes)
+
+        # Save the spreadsheet changes not already saved before Phase 2
+        if len(spreadsheet_changes) > saved_changes:
+            save_sheet_patch(df, sheet_patch, SPREADSHEET_PATH, len(spreadsheet_changes) - saved_changes)
+
+        # Assemble the whole report in memory and append it to the discrepancies file in one write
+        report = [report_header]
+        if quit_processing:
+            report.append(f"\n=== PROCESSING STOPPED BY USER ===\n\n")
         if missing_assets:
-            # Log all changes
-            with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-                discrepancy_file.write("\n" + "=" * 40 + "\n")
-                discrepancy_file.write("MISSING ASSETS ON LS:\nAssets not found in Lansweeper but present in spreadsheet\n")
-                discrepancy_file.write("=" * 40 + "\n")
-                for missing in missing_assets:
-                    discrepancy_file.write(missing)
+            report += report_section("MISSING ASSETS ON LS:\nAssets not found in Lansweeper but present in spreadsheet\n", missing_assets, separator="\n")
         if duplicate_assets:
-            # Log all changes
-            with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-                discrepancy_file.write("\n\n" + "=" * 40 + "\n")
-                discrepancy_file.write("DUPLICATE ASSETS:\nSpreadsheet assets with multiple entries for same serial number in Lansweeper\n")
-                discrepancy_file.write("=" * 40 + "\n")
-                for duplicate in duplicate_assets:
-                    discrepancy_file.write(duplicate)
+            report += report_section("DUPLICATE ASSETS:\nSpreadsheet assets with multiple entries for same serial number in Lansweeper\n", duplicate_assets)
         if missing_info:
-            # Log all changes
-            with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-                discrepancy_file.write("\n\n" + "=" * 40 + "\n")
-                discrepancy_file.write("ASSETS WITH MISSING FIELDS:\nAssets with missing fields in both spreadsheet and Lansweeper\n")
-                discrepancy_file.write("=" * 40 + "\n")
-                for missing in missing_info:
-                    discrepancy_file.write(missing)
+            report += report_section("ASSETS WITH MISSING FIELDS:\nAssets with missing fields in both spreadsheet and Lansweeper\n", missing_info)
         if conflicts_for_review:
-            # Log all changes
-            with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-                discrepancy_file.write("\n\n" + "=" * 40 + "\n")
-                discrepancy_file.write("UNRESOLVED CONFLICTS:\n")
-                discrepancy_file.write("=" * 40 + "\n")
-                for conflict in conflicts_for_review:
-                    discrepancy_file.write(conflict)
-                discrepancy_file.write("\n")
+            report += report_section("UNRESOLVED CONFLICTS:\n", conflicts_for_review, trailer="\n")
         if conflict_info:
-            # Log all changes
-            with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-                discrepancy_file.write("\n\n" + "=" * 40 + "\n")
-                discrepancy_file.write("RESOLVED CONFLICTS:\n")
-                discrepancy_file.write("=" * 40 + "\n")
-                for conflict in conflict_info:
-                    discrepancy_file.write(conflict)
-                discrepancy_file.write("\n")
+            report += report_section("RESOLVED CONFLICTS:\n", conflict_info, trailer="\n")
         if spreadsheet_changes:
-            logger.info(f"Saving {len(spreadsheet_changes)} changes to spreadsheet...")
-            df.to_excel(SPREADSHEET_PATH, index=False)
-            
-            # Log all changes
-            with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-                discrepancy_file.write("\n\n" + "=" * 40 + "\n")
-                discrepancy_file.write("SPREADSHEET CHANGES MADE:\n")
-                discrepancy_file.write("=" * 40 + "\n")
-                for change in spreadsheet_changes:
-                    discrepancy_file.write(change)
+            report += report_section("SPREADSHEET CHANGES MADE:\n", spreadsheet_changes)
         if ls_changes:
-            # Log all changes
-            with open(DISCREPANCIES_FILE, 'a') as discrepancy_file:
-                discrepancy_file.write("\n\n" + "=" * 40 + "\n")
-                discrepancy_file.write("LS CHANGES MADE:\n")
-                discrepancy_file.write("=" * 40 + "\n")
-                for change in ls_changes:
-                    discrepancy_file.write(change)
-                discrepancy_file.write("\n")
+            report += report_section("LS CHANGES MADE:\n", ls_changes, trailer="\n")
+        with open(DISCREPANCIES_FILE, 'a', buffering=REPORT_BUFFER_SIZE) as discrepancy_file:
+            discrepancy_file.write("".join(report))
         
+        # Per-row details are logged at DEBUG; summarize the run in one record instead
+        logger.info(
+            "Checked %d rows: %d already in sync, %d conflicts, %d spreadsheet changes, %d Lansweeper updates sent, "
+            "%d missing assets, %d duplicate assets, %d empty fields",
+            len(df), int(in_sync.sum()), len(pending_conflicts), len(spreadsheet_changes), sum(len(batch) for batch, _ in update_batches),
+            len(missing_assets), len(duplicate_assets), len(missing_info)
+        )
         logger.info(f"Processing complete. Total API requests made: {api.request_count}")
         if quit_processing:
             logger.info("Processing was stopped by user")
-        logger.info(f"Check {DISCREPANCIES_FILE} for results.")
+        logger.info(f"Check {DISCREPANCIES_FILE} for results.", extra={'console': True})
         
     except FileNotFoundError:
         logger.error(f"Spreadsheet file not found: {SPREADSHEET_PATH}")
     except Exception as e:
         logger.error(f"An error occurred: {e}")
+    finally:
+        api.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,4 +1,17 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+
+def _attach_queue(logger, *handlers):
+    # Route records through a queue so formatting and file I/O happen on a listener thread
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued when the interpreter exits
+    atexit.register(listener.stop)
 
 def setup_loggers():
     # Create logger for asset_update module
@@ -9,7 +22,6 @@ def setup_loggers():
     asset_handler = logging.FileHandler('asset_update_audit.log')
     asset_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     asset_handler.setFormatter(asset_formatter)
-    asset_logger.addHandler(asset_handler)
     
     # Create logger for test module
     test_logger = logging.getLogger('test')
@@ -19,10 +31,16 @@ def setup_loggers():
     test_handler = logging.FileHandler('debug.log')
     test_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     test_handler.setFormatter(test_formatter)
-    test_logger.addHandler(test_handler)
     
-    # Optionally add a StreamHandler to both for console output
+    # Add a StreamHandler to both for console output: warnings, errors and records logged with
+    # extra={'console': True} by default, every INFO record too with LOG_STDOUT=1. The row loop
+    # logs at DEBUG, so the terminal never gets a record per row
+    console_level = logging.INFO if os.getenv('LOG_STDOUT') else logging.WARNING
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(asset_formatter)  # or test_formatter
-    asset_logger.addHandler(stream_handler)
-    test_logger.addHandler(stream_handler)
+    stream_handler.addFilter(lambda record: record.levelno >= console_level or getattr(record, 'console', False))
+    asset_handlers = [asset_handler, stream_handler]
+    test_handlers = [test_handler, stream_handler]
+
+    _attach_queue(asset_logger, *asset_handlers)
+    _attach_queue(test_logger, *test_handlers)
@@ -1,6 +1,7 @@
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
-import json
+import orjson
 from datetime import datetime
 import logging
 import os
@@ -8,7 +9,7 @@ import time
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 
-from asset_update import is_empty, parse_date, compare_values, get_user_choice
+from asset_update import is_empty, parse_date, get_user_choice
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,18 +36,29 @@ class LansweeperAPI:
             "Authorization": f"Token {pat_token}"
         }
         self.request_count = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._asset_cache = {}  # Serial number -> asset (None if not found) from earlier lookups
+
+        # Reuse one keep-alive connection instead of a new TLS handshake per request
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
     
     def _check_rate_limit(self):
-        """Check if we need to wait due to rate limiting"""
-        # Lansweeper API allows 150 requests per minute, but we will most likely not hit this limit if only this script is running
-        if self.request_count % 150 == 0 and self.request_count > 0:
-            logger.info(f"Reached {self.request_count} requests.")
-            choice = input("Press enter to continue processing, or 'q' to quit: ").strip()
-            if choice == 'q':
-                logger.info("User chose to quit processing.")
-                global quit_processing
-                quit_processing = True
-                return
+        """Wait out the rest of the minute once 150 requests have been sent in it"""
+        # Lansweeper API allows 150 requests per minute; sleep instead of prompting so runs stay unattended
+        if time.monotonic() - self._window_start >= 60:
+            # The minute has passed, start a new window
+            self._window_start = time.monotonic()
+            self._window_count = 0
+        if self._window_count >= 150:
+            sleep_for = max(0, 60 - (time.monotonic() - self._window_start))
+            logger.info(f"Reached {self._window_count} requests this minute, waiting {sleep_for:.1f}s")
+            time.sleep(sleep_for)
+            self._window_start = time.monotonic()
+            self._window_count = 0
+        self._window_count += 1
 
     def get_asset_by_serial(self, serial_number: str) -> Optional[Dict[str, Any]]:
         """
@@ -58,6 +70,10 @@ class LansweeperAPI:
         Returns:
             Asset data dictionary or None if not found
         """
+        # Repeated serials are answered without another request
+        if serial_number in self._asset_cache:
+            return self._asset_cache[serial_number]
+
         self._check_rate_limit()
         self.request_count += 1
         
@@ -75,15 +91,11 @@ class LansweeperAPI:
                     }
                     fields: [
                         "key"
-                        "assetBasicInfo.name"
                         "assetCustom.barCode"
-                        "assetCustom.serialNumber"
                         "assetCustom.purchaseDate"
                         "assetCustom.warrantyDate"
-                        "url"
                     ]
                 ) {
-                    total
                     items
                 }
             }
@@ -96,26 +108,27 @@ class LansweeperAPI:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.base_url,
-                headers=self.headers,
-                json={"query": query, "variables": variables}
+                data=orjson.dumps({"query": query, "variables": variables})
             )
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             if 'errors' in data:
                 logger.error(f"GraphQL errors for serial {serial_number}: {data['errors']}")
                 return None
             
             assets = data['data']['site']['assetResources']['items']
             if assets:
+                self._asset_cache[serial_number] = assets[0]
                 return assets[0]
             else:
                 logger.warning(f"No asset found with serial number: {serial_number}")
+                self._asset_cache[serial_number] = None
                 return None
                 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             logger.error(f"Request failed for serial {serial_number}: {e}")
             return None
         except (KeyError, TypeError) as e:
@@ -148,12 +161,10 @@ class LansweeperAPI:
                     }
                     fields: [
                         "key"
-                        "assetBasicInfo.name"
                         "assetCustom.barCode"
                         "assetCustom.serialNumber"
                         "assetCustom.purchaseDate"
                         "assetCustom.warrantyDate"
-                        "url"
                     ]
                 ) {
                     total
@@ -169,15 +180,14 @@ class LansweeperAPI:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.base_url,
-                headers=self.headers,
-                json={"query": query, "variables": variables}
+                data=orjson.dumps({"query": query, "variables": variables})
             )
             response.raise_for_status()
             
-            data = response.json()
-            logger.debug(f"Response data for serial {json.dumps(data, indent=2)}\n")
+            data = orjson.loads(response.content)
+            logger.debug(f"Response data for serial {orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()}\n")
             logger.debug(f"Number of items returned: {data['data']['site']['assetResources']['total']}")
             if 'errors' in data:
                 logger.error(f"GraphQL errors for serial {serial_number}: {data['errors']}")
@@ -190,7 +200,7 @@ class LansweeperAPI:
                 logger.warning(f"No asset found with serial number: {serial_number}")
                 return None
                 
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             logger.error(f"Request failed for serial {serial_number}: {e}")
             return None
         except (KeyError, TypeError) as e:
@@ -255,22 +265,22 @@ class LansweeperAPI:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.base_url,
-                headers=self.headers,
-                json={"query": mutation, "variables": variables}
+                data=orjson.dumps({"query": mutation, "variables": variables})
             )
             response.raise_for_status()
 
-            data = response.json()
+            data = orjson.loads(response.content)
             if 'errors' in data:
                 logger.error(f"Update failed for Serial {serial_number}: {data['errors']}")
                 return False
 
             logger.info(f"Successfully updated Serial {serial_number} with fields: {list(fields_to_update.keys())}")
+            self._asset_cache.pop(serial_number, None)
             return True
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             logger.error(f"Update request failed for Serial {serial_number}: {e}")
             return False
 